@@ -1,10 +1,16 @@
 # app.py
-from fastapi import FastAPI, Query, Response
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
-from ilive_feed import get_digest, render_json, render_markdown, render_csv, FEED_URL
+from ilive_feed import render_digest, close_client, FEED_URL
 
-app = FastAPI(title="InvestingLive Digest API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_client()
+
+app = FastAPI(title="InvestingLive Digest API", lifespan=lifespan)
 
 # Allow OpenAI Actions to call you (broad CORS is fine for server-to-server)
 app.add_middleware(
@@ -14,26 +20,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+MEDIA_TYPES = {
+    "json": "application/json; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CACHE_CONTROL = "max-age=60"
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.get("/digest")
-def digest(
+async def digest(
+    request: Request,
     format: str = Query("json", pattern="^(json|markdown|csv)$"),
     hours: Optional[int] = Query(None, ge=1, le=72),
     limit: int = Query(40, ge=1, le=200),
     url: str = Query(FEED_URL),
 ):
-    items = get_digest(url=url, hours=hours, limit=limit)
-
-    # If 304 / no change, return empty array or an informational message
-    if format == "json":
-        body = render_json(items)
-        return Response(content=body, media_type="application/json; charset=utf-8")
-    elif format == "markdown":
-        body = render_markdown(items)
-        return Response(content=body, media_type="text/markdown; charset=utf-8")
+    body, etag = await render_digest(
+        url=url, fmt=format, hours=hours, limit=limit,
+        if_none_match=request.headers.get("if-none-match"),
+    )
+    if etag:
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
     else:
-        body = render_csv(items)
-        return Response(content=body, media_type="text/csv; charset=utf-8")
+        # Upstream 304 with nothing parsed yet: the body is an empty digest,
+        # so don't let clients or proxies hold on to it.
+        headers = {"Cache-Control": "no-store"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=MEDIA_TYPES[format], headers=headers)
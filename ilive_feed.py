@@ -1,17 +1,26 @@
 # ilive_feed.py
 from __future__ import annotations
-import io, json, csv, os, time, re
-from dataclasses import dataclass, asdict
+import asyncio, hashlib, io, csv, re, time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict, Any
-from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from operator import attrgetter
+from typing import List, Optional, Dict, Any, Tuple
 
 import httpx
-import feedparser
+import orjson
+from lxml import etree
 from dateutil import parser as dtparse
 from zoneinfo import ZoneInfo
-from bs4 import BeautifulSoup
 import html as htmllib
+from html.entities import html5 as HTML5_ENTITIES
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # fall back to the pure-Python parser
+    LexborHTMLParser = None
+    from bs4 import BeautifulSoup
 
 FEED_URL = "https://investinglive.com/feed"
 UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -19,6 +28,13 @@ UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
 CACHE_FILE = ".ilive_feed_cache.json"
 NY_TZ = ZoneInfo("America/New_York")
 MAX_SUMMARY_CHARS = 220
+DC_DATE = "{http://purl.org/dc/elements/1.1/}date"
+RSS1 = "{http://purl.org/rss/1.0/}"
+ATOM = "{http://www.w3.org/2005/Atom}"
+# RSS 2.0 <item>, RSS 1.0 (RDF) <item> and Atom <entry>
+FEED_ITEM_TAGS = ("item", f"{RSS1}item", f"{ATOM}entry")
+PARSED_CACHE_SIZE = 4
+RENDER_CACHE_SIZE = 64
 
 KEYWORD_TAGS = {
     r"\b(xau|gold)\b": "#XAU",
@@ -37,40 +53,104 @@ KEYWORD_TAGS = {
     r"\b(risk[- ]?on|risk[- ]?off|sentiment)\b": "#RISK",
 }
 
-@dataclass
+KEYWORD_TAGS_COMPILED: List[Tuple[re.Pattern, str]] = [
+    (re.compile(pat), tag) for pat, tag in KEYWORD_TAGS.items()
+]
+
+# First path segment of a URL: optional scheme, optional //netloc, then the
+# segment up to the next "/", "?" or "#" (what urlparse(...).path would give).
+_URL_SECTION = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.\-]*:)?(?://[^/?#]*)?/*([^/?#]*)")
+
+# HTML named entities (&rsquo;, &nbsp;, ...) are undeclared in XML and libxml2's
+# recover mode drops the rest of the text at the first one; rewrite them as
+# numeric references (unknown names as literal text) first. CDATA sections are
+# matched so they pass through untouched.
+_XML_ENTITY = re.compile(rb"<!\[CDATA\[.*?\]\]>|&([A-Za-z][A-Za-z0-9]*);", re.DOTALL)
+_XML_PREDEFINED = {b"amp", b"lt", b"gt", b"quot", b"apos"}
+
+_WS_NL = re.compile(r"\s*\n\s*")
+_WS_MULTI = re.compile(r"\s{2,}")
+
+# Slotted and frozen: no per-instance __dict__, and items can be shared safely
+# between cached feeds and callers.
+@dataclass(slots=True, frozen=True)
 class Item:
     title: str
     link: str
     published_ny: Optional[str]
-    tags: List[str]
+    tags: Tuple[str, ...]
     summary: str
+    # Unix timestamp of the publish time (0 when unknown), used to sort and filter.
+    ts: int = field(default=0, repr=False)
 
 def _load_cache() -> Dict[str, Any]:
-    if os.path.exists(CACHE_FILE):
-        try:
-            import json
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+    try:
+        with open(CACHE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
 
 def _save_cache(cache: Dict[str, Any]) -> None:
     try:
-        import json
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f)
-    except Exception:
+        with open(CACHE_FILE, "wb") as f:
+            f.write(orjson.dumps(cache))
+    except (OSError, orjson.JSONEncodeError):
         pass
 
-def polite_fetch(url: str, max_retries: int = 5, timeout: float = 15.0) -> Optional[str]:
+# One shared client so the TCP/TLS/HTTP2 connection is reused (and multiplexed)
+# across fetches; only the conditional headers vary per request. It is created
+# on first use and bound to that event loop, so it must be released with
+# close_client() before the loop ends (the app does this on shutdown); the next
+# use then starts a fresh pool.
+_http: Optional[httpx.AsyncClient] = None
+
+# Parsed feeds kept in-process, keyed by (url, ETag) or by a hash of the body
+# when the server sends no ETag, so an unchanged feed is never parsed twice.
+# Least-recently-used entries are evicted first.
+_parsed_cache: "OrderedDict[Tuple[str, str], Tuple[Item, ...]]" = OrderedDict()
+
+# Rendered bodies keyed by (url, etag, format, hours, limit, window), LRU.
+_render_cache: "OrderedDict[Tuple[str, str, str, Optional[int], int, int], str]" = OrderedDict()
+
+# In-flight feed loads per URL, so concurrent callers share one upstream fetch.
+_inflight: Dict[str, asyncio.Task] = {}
+
+# Cache key of the feed last parsed for each URL. A 304 is resolved through
+# this rather than the on-disk ETag, which may be absent (Last-Modified only)
+# or belong to a different URL.
+_last_key: Dict[str, Tuple[str, str]] = {}
+
+def _client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            http2=True,
+            headers={
+                "User-Agent": UA,
+                "Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+                # RSS compresses very well; httpx decodes br via the brotli extra.
+                "Accept-Encoding": "br, gzip",
+                "Connection": "keep-alive",
+            },
+            follow_redirects=True,
+            timeout=15.0,
+            limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=60),
+        )
+    return _http
+
+async def close_client() -> None:
+    global _http
+    client, _http = _http, None
+    if client is not None:
+        await client.aclose()
+
+async def polite_fetch(url: str, max_retries: int = 5, timeout: float = 15.0) -> Tuple[Optional[bytes], Optional[str]]:
     cache = _load_cache()
-    headers = {
-        "User-Agent": UA,
-        "Accept": "application/rss+xml, application/xml;q=0.9, */*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Connection": "keep-alive",
-    }
+    # The on-disk validators are for a single feed; don't send them to another.
+    if cache.get("url") != url:
+        cache = {}
+    headers = {}
     if et := cache.get("etag"):
         headers["If-None-Match"] = et
     if lm := cache.get("last_modified"):
@@ -79,143 +159,192 @@ def polite_fetch(url: str, max_retries: int = 5, timeout: float = 15.0) -> Optio
     backoff = 1.0
     for attempt in range(1, max_retries + 1):
         try:
-            with httpx.Client(http2=True, headers=headers, follow_redirects=True, timeout=timeout) as client:
-                r = client.get(url)
+            r = await _client().get(url, headers=headers, timeout=timeout)
             if r.status_code == 304:
-                return None
+                return None, cache.get("etag")
             if r.status_code == 200:
                 new_cache = {
+                    "url": url,
                     "etag": r.headers.get("ETag") or cache.get("etag"),
                     "last_modified": r.headers.get("Last-Modified") or cache.get("last_modified"),
                     "fetched_at": datetime.now(timezone.utc).isoformat(),
                 }
                 _save_cache(new_cache)
-                return r.text
+                # Raw bytes: libxml2 honours the XML declaration's encoding itself.
+                return r.content, r.headers.get("ETag")
             if r.status_code in (429, 503):
-                time.sleep(backoff + (0.1 * attempt))
+                await asyncio.sleep(backoff + (0.1 * attempt))
                 backoff = min(backoff * 2, 30)
                 continue
             r.raise_for_status()
         except httpx.HTTPError:
             if attempt == max_retries:
                 raise
-            time.sleep(backoff)
+            await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 30)
-    return None
+    return None, None
 
 def _to_ny(dt: datetime) -> datetime:
     if not dt.tzinfo:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(NY_TZ)
 
-def _coerce_dt(s: str | None, fallback_struct=None) -> Optional[datetime]:
-    if not s and not fallback_struct:
+def _coerce_dt(s: str | None) -> Optional[datetime]:
+    if not s:
         return None
     try:
-        if s:
-            return dtparse.parse(s)
-    except Exception:
+        # RSS pubDate is RFC 2822; the stdlib parser is far cheaper than dateutil.
+        return parsedate_to_datetime(s)
+    except (TypeError, ValueError):
         pass
-    if fallback_struct:
-        try:
-            return datetime(*fallback_struct[:6], tzinfo=timezone.utc)
-        except Exception:
-            return None
-    return None
+    try:
+        return dtparse.parse(s)
+    except Exception:
+        return None
 
 def _extract_tags(text: str) -> List[str]:
-    tags = []
+    # Lowercasing once beats re.IGNORECASE here: case-insensitive patterns lose
+    # re's literal fast paths, which costs more than the copy.
     lower = text.lower()
-    for pat, tag in KEYWORD_TAGS.items():
-        if re.search(pat, lower):
-            tags.append(tag)
-    seen, ordered = set(), []
-    for t in tags:
-        if t not in seen:
-            seen.add(t)
-            ordered.append(t)
-    return ordered
+    # dict keys keep KEYWORD_TAGS order and drop repeats in the same pass
+    return list(dict.fromkeys(tag for pat, tag in KEYWORD_TAGS_COMPILED if pat.search(lower)))
 
 def _html_to_text(html: str) -> str:
     if not html:
         return ""
-    soup = BeautifulSoup(html, "html.parser")
-    for ul in soup.find_all(["ul", "ol"]):
-        for li in ul.find_all("li"):
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html)
+        # bs4's get_text skips script/style contents; lexbor would include them.
+        tree.strip_tags(["script", "style"])
+        for li in tree.css("li"):
             li.insert_before("\n• ")
-        ul.unwrap()
-    text = soup.get_text(separator=" ", strip=True)
+        text = tree.text(separator=" ", strip=True)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        for ul in soup.find_all(["ul", "ol"]):
+            for li in ul.find_all("li"):
+                li.insert_before("\n• ")
+            ul.unwrap()
+        text = soup.get_text(separator=" ", strip=True)
     text = htmllib.unescape(text)
-    text = re.sub(r"\s*\n\s*", "\n", text)
-    text = re.sub(r"\s{2,}", " ", text).strip()
+    text = _WS_NL.sub("\n", text)
+    text = _WS_MULTI.sub(" ", text).strip()
     if len(text) > MAX_SUMMARY_CHARS:
         text = text[:MAX_SUMMARY_CHARS].rstrip() + "…"
     return text
 
 def _section_tag_from_url(link: str) -> str | None:
-    try:
-        path = urlparse(link).path.strip("/")
-        first = (path.split("/", 1) + [""])[0]
-        if first:
-            return f"#{first.replace('-', '_')}".upper()
-    except Exception:
-        pass
+    first = _URL_SECTION.match(link).group(1)
+    if first:
+        return f"#{first.replace('-', '_')}".upper()
     return None
 
-def parse_feed(xml_text: str) -> List[Item]:
-    fp = feedparser.parse(xml_text)
+def _numeric_entity(m: re.Match) -> bytes:
+    name = m.group(1)
+    if name is None or name in _XML_PREDEFINED:
+        return m.group(0)
+    chars = HTML5_ENTITIES.get(name.decode("ascii") + ";")
+    if chars is None:
+        # Unknown name: keep it as literal text rather than losing the rest.
+        return b"&amp;" + name + b";"
+    return "".join(f"&#{ord(c)};" for c in chars).encode("ascii")
+
+def _atom_link(e) -> str:
+    for link in e.iterfind(f"{ATOM}link"):
+        if link.get("rel", "alternate") == "alternate":
+            return link.get("href") or ""
+    return ""
+
+# (title, link, date, html summary) for an RSS 2.0/1.0 item or an Atom entry.
+def _item_fields(e) -> Tuple[str, str, str, str]:
+    if e.tag == f"{ATOM}entry":
+        return (
+            e.findtext(f"{ATOM}title") or "",
+            _atom_link(e),
+            e.findtext(f"{ATOM}published") or e.findtext(f"{ATOM}updated") or "",
+            e.findtext(f"{ATOM}summary") or e.findtext(f"{ATOM}content") or "",
+        )
+    ns = RSS1 if e.tag == f"{RSS1}item" else ""
+    return (
+        e.findtext(f"{ns}title") or "",
+        e.findtext(f"{ns}link") or "",
+        e.findtext("pubDate") or e.findtext(DC_DATE) or "",
+        e.findtext(f"{ns}description") or "",
+    )
+
+def _item_from_element(e) -> Item:
+    title, link, dt_raw, html = _item_fields(e)
+    dt = _coerce_dt(dt_raw.strip())
+    if dt:
+        dt = _to_ny(dt)
+    dt_ny = f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}" if dt else None
+
+    title = title.strip()
+    summary = _html_to_text(html)
+    link = link.strip()
+
+    all_text = f"{title} {summary}"
+    tags = _extract_tags(all_text)
+    sec = _section_tag_from_url(link)
+    if sec and sec not in tags:
+        tags.insert(0, sec)
+
+    return Item(title=title, link=link, published_ny=dt_ny, tags=tuple(tags), summary=summary,
+                ts=int(dt.timestamp()) if dt else 0)
+
+def parse_feed(xml: bytes) -> List[Item]:
     items: List[Item] = []
-    for e in fp.entries:
-        dt_raw = e.get("published") or e.get("updated") or ""
-        dt_struct = e.get("published_parsed") or e.get("updated_parsed")
-        dt = _coerce_dt(dt_raw, dt_struct)
-        dt_ny = _to_ny(dt).strftime("%Y-%m-%d %H:%M") if dt else None
-
-        title = e.get("title", "").strip()
-        summary = _html_to_text(e.get("summary", "") or "")
-        link = e.get("link", "").strip()
-
-        all_text = f"{title} {summary}"
-        tags = _extract_tags(all_text)
-        sec = _section_tag_from_url(link)
-        if sec and sec not in tags:
-            tags.insert(0, sec)
-
-        items.append(Item(title=title, link=link, published_ny=dt_ny, tags=tags, summary=summary))
-    items.sort(key=lambda x: x.published_ny or "", reverse=True)
+    # Walk <item> elements as they complete and drop each one once converted,
+    # so the full document tree is never held in memory.
+    xml = _XML_ENTITY.sub(_numeric_entity, xml)
+    events = etree.iterparse(io.BytesIO(xml), events=("end",), tag=FEED_ITEM_TAGS,
+                             recover=True, resolve_entities=False, no_network=True)
+    try:
+        for _, e in events:
+            items.append(_item_from_element(e))
+            e.clear(keep_tail=True)
+            while e.getprevious() is not None:
+                del e.getparent()[0]
+    except etree.XMLSyntaxError:
+        # Keep whatever parsed before the damage, like feedparser's bozo mode.
+        pass
+    items.sort(key=attrgetter("ts"), reverse=True)
     return items
 
 def filter_items(items: List[Item], hours: Optional[int], limit: Optional[int]) -> List[Item]:
     if hours:
-        cutoff = datetime.now(NY_TZ) - timedelta(hours=hours)
-        items = [
-            it for it in items
-            if (it.published_ny and dtparse.parse(it.published_ny).replace(tzinfo=NY_TZ) >= cutoff)
-        ]
+        cutoff_ts = int((datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp())
+        items = [it for it in items if it.ts >= cutoff_ts]
     if limit:
         items = items[:limit]
     return items
 
 def render_markdown(items: List[Item]) -> str:
-    out = io.StringIO()
+    parts = ["# InvestingLive Feed Digest (NY time)\n"]
     current_date = None
-    print("# InvestingLive Feed Digest (NY time)\n", file=out)
     for it in items:
         date_part = it.published_ny.split(" ")[0] if it.published_ny else "Unknown"
         if date_part != current_date:
             current_date = date_part
-            print(f"\n## {current_date}", file=out)
+            parts.append(f"\n## {current_date}")
         tag_str = " ".join(it.tags) if it.tags else ""
         time_part = it.published_ny.split(" ")[1] if it.published_ny else "--:--"
         title = it.title.replace("\n", " ").strip()
-        print(f"- **{time_part}** — [{title}]({it.link})  {tag_str}", file=out)
+        parts.append(f"- **{time_part}** — [{title}]({it.link})  {tag_str}")
         if it.summary:
             s = it.summary.replace("\n• ", "\n    • ")
-            print(f"  - {s}", file=out)
-    return out.getvalue().strip()
+            parts.append(f"  - {s}")
+    return "\n".join(parts).strip()
 
 def render_json(items: List[Item]) -> str:
-    return json.dumps([asdict(it) for it in items], ensure_ascii=False, indent=2)
+    return orjson.dumps(
+        [
+            {"title": it.title, "link": it.link, "published_ny": it.published_ny,
+             "tags": it.tags, "summary": it.summary}
+            for it in items
+        ],
+        option=orjson.OPT_INDENT_2,
+    ).decode()
 
 def render_csv(items: List[Item]) -> str:
     out = io.StringIO()
@@ -231,10 +360,84 @@ def render_csv(items: List[Item]) -> str:
         ])
     return out.getvalue()
 
-def get_digest(url: str = FEED_URL, hours: int | None = None, limit: int = 50) -> List[Item]:
-    xml = polite_fetch(url)
+RENDERERS = {"json": render_json, "markdown": render_markdown, "csv": render_csv}
+
+async def _load_feed(url: str) -> Tuple[Tuple[Item, ...], Optional[str]]:
+    xml, etag = await polite_fetch(url)
     if xml is None:
-        # No change; return empty list (caller can decide how to handle)
-        return []
-    items = parse_feed(xml)
-    return filter_items(items, hours, limit)
+        key = _last_key.get(url)
+        items = _parsed_cache.get(key) if key else None
+        if items is None:
+            # No change and nothing parsed yet in this process; return empty list
+            # (caller can decide how to handle)
+            return (), None
+        _parsed_cache.move_to_end(key)
+        return items, key[1]
+    if not etag:
+        etag = hashlib.blake2b(xml, digest_size=16).hexdigest()
+    key = (url, etag)
+    items = _parsed_cache.get(key)
+    if items is None:
+        # Parsing is CPU-bound; keep it off the event loop.
+        items = tuple(await asyncio.to_thread(parse_feed, xml))
+        if len(_parsed_cache) >= PARSED_CACHE_SIZE:
+            _parsed_cache.popitem(last=False)
+        _parsed_cache[key] = items
+    else:
+        _parsed_cache.move_to_end(key)
+    _last_key[url] = key
+    return items, etag
+
+async def _shared_load(url: str) -> Tuple[Tuple[Item, ...], Optional[str]]:
+    task = _inflight.get(url)
+    if task is None:
+        task = asyncio.ensure_future(_load_feed(url))
+        _inflight[url] = task
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+    # Shielded so one caller going away doesn't cancel the fetch for the others.
+    return await asyncio.shield(task)
+
+def _render_cached(items: Tuple[Item, ...], key: Tuple[str, str, str, Optional[int], int, int]) -> str:
+    body = _render_cache.get(key)
+    if body is None:
+        _, _, fmt, hours, limit, _ = key
+        body = RENDERERS[fmt](filter_items(list(items), hours, limit))
+        if len(_render_cache) >= RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+        _render_cache[key] = body
+    else:
+        _render_cache.move_to_end(key)
+    return body
+
+async def get_digest(url: str = FEED_URL, hours: int | None = None, limit: int = 50) -> Tuple[List[Item], Optional[str]]:
+    items, etag = await _shared_load(url)
+    return filter_items(list(items), hours, limit), etag
+
+def _digest_etag(url: str, etag: str, fmt: str, hours: int | None, limit: int, window: int) -> str:
+    # Weak: this hashes the render key, not the body, and an hours= body
+    # re-rendered within the same minute can differ by an aged-out item.
+    key = f"{url}|{etag}|{fmt}|{hours}|{limit}|{window}".encode()
+    return f'W/"{hashlib.blake2b(key, digest_size=16).hexdigest()}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ is ignored on both sides.
+    opaque = etag.removeprefix("W/")
+    return opaque in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+async def render_digest(url: str = FEED_URL, fmt: str = "json", hours: int | None = None, limit: int = 50,
+                        if_none_match: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    # Returns (body, etag); body is None when if_none_match already names this etag.
+    items, etag = await _shared_load(url)
+    if etag is None:
+        return RENDERERS[fmt](filter_items(list(items), hours, limit)), None
+    # An hours window moves with the clock, so such bodies are only reused
+    # within the same minute; unwindowed ones live until the ETag changes.
+    window = int(time.time() // 60) if hours else 0
+    tag = _digest_etag(url, etag, fmt, hours, limit, window)
+    if _etag_matches(if_none_match, tag):
+        return None, tag
+    return _render_cached(items, (url, etag, fmt, hours, limit, window)), tag